@@ -1,17 +1,41 @@
 import csv
 import json
-import time
 from collections import Counter
-from typing import Callable, Dict, Iterable, List, Tuple, Union
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from ps2_census import Collection, Join, Query
 from ps2_census.enums import Faction
 from slugify import slugify
 
-from utils import batch
+from phase_profiler import profiler
+from sessions import (
+    SESSION_INACTIVITY_GAP,
+    get_session_columns,
+    get_sessions,
+    session_columns,
+)
+from transport import transport
+from utils import batch, merge_intervals
 
 ACTIVITY_PERIOD: int = 12 * 60 * 60
 
+RIBBON_ACHIEVEMENT_IDS: Dict[str, int] = {
+    "marksman_ribbons": 90028,
+    "killstreak_ribbons": 90036,
+    "bountycontracts_ribbons": 92038,
+    "repair_ribbons": 2553,
+    "squadleadership_ribbons": 90040,
+    "pointcontrol_ribbons": 90030,
+    "piloting_ribbons": 2555,
+    "healing_ribbons": 2554,
+    "spotter_ribbons": 90024,
+    "objectivesupport_ribbons": 90032,
+    "savior_ribbons": 90021,
+    "reviving_ribbons": 2552,
+    "logistics_ribbons": 8006,
+    "resupply_ribbons": 7995,
+}
+
 character_events_query_factory: Callable[[], Query] = Query(
     Collection.CHARACTERS_EVENT
 ).join(
@@ -110,11 +134,13 @@ def get_character_events(
                 .limit_per_db(max_query_events)
             )
 
-            res: dict = query.get()
+            with profiler.phase("query"):
+                res: dict = transport.get(query)
 
             queries_count += 1
 
-            time.sleep(0.25)
+            with profiler.phase("throttle"):
+                transport.throttle(0.25)
 
             if "returned" not in res:
                 print(res)
@@ -144,8 +170,8 @@ def get_character_events(
     return events
 
 
-def get_active_outfit_members(
-    service_id: str, outfit_tag: str, active_after_ts: int
+def get_outfit_members(
+    service_id: str, outfit_tag: str
 ) -> List[Dict[str, Union[int, str]]]:
     print(f"Getting outfit members")
 
@@ -153,7 +179,7 @@ def get_active_outfit_members(
         "alias", outfit_tag
     )
 
-    res: dict = query.get()
+    res: dict = transport.get(query)
 
     if "returned" not in res:
         print(res)
@@ -173,6 +199,17 @@ def get_active_outfit_members(
     ]
 
     print(f"Got {len(members)} outfit members")
+    return members
+
+
+def get_active_outfit_members(
+    service_id: str,
+    outfit_tag: str,
+    active_after_ts: int,
+    members: Optional[List[Dict[str, Union[int, str]]]] = None,
+) -> List[Dict[str, Union[int, str]]]:
+    if members is None:
+        members = get_outfit_members(service_id=service_id, outfit_tag=outfit_tag)
 
     active_members: List[Dict[str, str]] = list(
         filter(lambda x: x["last_login"] >= active_after_ts - ACTIVITY_PERIOD, members)
@@ -182,39 +219,409 @@ def get_active_outfit_members(
     return active_members
 
 
+def get_ribbons_metric(achievement_id: int) -> Callable[[int, List[dict]], int]:
+    return lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("event_type") == "AchievementEarned"
+                and int(x["achievement_id"]) == achievement_id,
+                m_events,
+            )
+        )
+    )
+
+
+member_metrics: Dict[str, Callable[[int, List[dict]], Union[int, float, str]]] = {
+    "active_time_hours": lambda m_id, m_events: round(
+        (15 * 60)
+        * len(
+            set(int(e["timestamp"]) // (15 * 60) for e in m_events)
+        )
+        / 3600,
+        2,
+    ),
+    "kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id,
+                m_events,
+            )
+        )
+    ),
+    "vs_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and Faction(int(x["character"]["faction_id"]))
+                == Faction.VANU_SOVEREIGNTY,
+                m_events,
+            )
+        )
+    ),
+    "nc_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and Faction(int(x["character"]["faction_id"]))
+                == Faction.NEW_CONGLOMERATE,
+                m_events,
+            )
+        )
+    ),
+    "tr_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and Faction(int(x["character"]["faction_id"]))
+                == Faction.TERRAN_REPUBLIC,
+                m_events,
+            )
+        )
+    ),
+    "nso_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and Faction(int(x["character"]["faction_id"]))
+                == Faction.NS_OPERATIVES,
+                m_events,
+            )
+        )
+    ),
+    "teamkills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and Faction(int(x["character"]["faction_id"]))
+                == Faction(int(x["attacker_character"]["faction_id"])),
+                m_events,
+            )
+        )
+    ),
+    "headshot_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id
+                and int(x["is_headshot"]) == 1,
+                m_events,
+            )
+        )
+    ),
+    "kill_weapons": lambda m_id, m_events: json.dumps(
+        Counter(
+            (
+                e["attacker_weapon_item"]["name"]["en"]
+                for e in filter(
+                    lambda x: x.get("table_type") == "kills"
+                    and int(x["character_id"]) != m_id
+                    and int(x["attacker_character_id"]) == m_id
+                    and "attacker_weapon_item" in x
+                    and "name" in x["attacker_weapon_item"],
+                    m_events,
+                )
+            )
+        ).most_common()
+    ),
+    "kill_vehicles": lambda m_id, m_events: json.dumps(
+        Counter(
+            (
+                e["vehicle"]["name"]["en"]
+                for e in filter(
+                    lambda x: x.get("table_type") == "kills"
+                    and int(x["character_id"]) != m_id
+                    and int(x["attacker_character_id"]) == m_id
+                    and "vehicle" in x,
+                    m_events,
+                )
+            )
+        ).most_common()
+    ),
+    "vehicle_destroys": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("event_type") == "VehicleDestroy"
+                and int(x["character_id"]) != m_id
+                and int(x["attacker_character_id"]) == m_id,
+                m_events,
+            )
+        )
+    ),
+    "deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id,
+                m_events,
+            )
+        )
+    ),
+    "vs_deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id
+                and "attacker_character" in x
+                and Faction(int(x["attacker_character"]["faction_id"]))
+                == Faction.VANU_SOVEREIGNTY,
+                m_events,
+            )
+        )
+    ),
+    "nc_deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id
+                and "attacker_character" in x
+                and Faction(int(x["attacker_character"]["faction_id"]))
+                == Faction.NEW_CONGLOMERATE,
+                m_events,
+            )
+        )
+    ),
+    "tr_deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id
+                and "attacker_character" in x
+                and Faction(int(x["attacker_character"]["faction_id"]))
+                == Faction.TERRAN_REPUBLIC,
+                m_events,
+            )
+        )
+    ),
+    "nso_deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id
+                and "attacker_character" in x
+                and Faction(int(x["attacker_character"]["faction_id"]))
+                == Faction.NS_OPERATIVES,
+                m_events,
+            )
+        )
+    ),
+    "teamdeaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) != m_id
+                and "attacker_character" in x
+                and Faction(int(x["attacker_character"]["faction_id"]))
+                == Faction(int(x["character"]["faction_id"])),
+                m_events,
+            )
+        )
+    ),
+    "self_kills": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "kills"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) == m_id,
+                m_events,
+            )
+        )
+    ),
+    "self_deaths": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("table_type") == "deaths"
+                and int(x["character_id"]) == m_id
+                and int(x["attacker_character_id"]) == m_id,
+                m_events,
+            )
+        )
+    ),
+    "death_weapons": lambda m_id, m_events: json.dumps(
+        Counter(
+            (
+                e["attacker_weapon_item"]["name"]["en"]
+                for e in filter(
+                    lambda x: x.get("table_type") == "deaths"
+                    and int(x["character_id"]) == m_id
+                    and int(x["attacker_character_id"]) != m_id
+                    and "attacker_weapon_item" in x
+                    and "name" in x["attacker_weapon_item"],
+                    m_events,
+                )
+            )
+        ).most_common()
+    ),
+    "death_vehicles": lambda m_id, m_events: json.dumps(
+        Counter(
+            (
+                e["vehicle"]["name"]["en"]
+                for e in filter(
+                    lambda x: x.get("table_type") == "deaths"
+                    and int(x["character_id"]) == m_id
+                    and int(x["attacker_character_id"]) != m_id
+                    and "vehicle" in x,
+                    m_events,
+                )
+            )
+        ).most_common()
+    ),
+    "facility_captures": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("event_type") == "PlayerFacilityCapture",
+                m_events,
+            )
+        )
+    ),
+    "facility_defends": lambda m_id, m_events: len(
+        list(
+            filter(
+                lambda x: x.get("event_type") == "PlayerFacilityDefend",
+                m_events,
+            )
+        )
+    ),
+    **{
+        column: get_ribbons_metric(achievement_id)
+        for column, achievement_id in RIBBON_ACHIEVEMENT_IDS.items()
+    },
+}
+
+
+def get_time_frames_members(
+    service_id: str, outfit_tag: str, time_frames: Iterable[Tuple[int, int]]
+) -> Dict[Tuple[int, int], List[Dict[str, str]]]:
+    # The roster is fetched once and filtered for each frame
+    with profiler.phase("roster"):
+        outfit_members: List[Dict[str, str]] = get_outfit_members(
+            service_id=service_id, outfit_tag=outfit_tag
+        )
+
+    return {
+        (from_ts, to_ts): get_active_outfit_members(
+            service_id=service_id,
+            outfit_tag=outfit_tag,
+            active_after_ts=from_ts,
+            members=outfit_members,
+        )
+        for from_ts, to_ts in time_frames
+    }
+
+
+def get_time_frames_events(
+    service_id: str,
+    time_frame_members: Dict[Tuple[int, int], List[Dict[str, str]]],
+    custom_filter: Callable[[dict], bool] = lambda _: True,
+    **kwargs,
+) -> List[dict]:
+    # Each member is fetched once over the union of the frames they are active
+    # in, so overlapping and adjacent frames cost the union of their ranges
+    member_time_frames: Dict[int, List[Tuple[int, int]]] = {}
+
+    for time_frame, frame_members in time_frame_members.items():
+        for m in frame_members:
+            member_time_frames.setdefault(m["id"], []).append(time_frame)
+
+    intervals_character_ids: Dict[Tuple[Tuple[int, int], ...], List[int]] = {}
+
+    m_id: int
+    m_time_frames: List[Tuple[int, int]]
+    for m_id, m_time_frames in member_time_frames.items():
+        intervals_character_ids.setdefault(
+            tuple(merge_intervals(m_time_frames)), []
+        ).append(m_id)
+
+    events: List[dict] = []
+
+    for intervals, character_ids in intervals_character_ids.items():
+        for from_ts, to_ts in intervals:
+            with profiler.phase("fetch"):
+                events += get_character_events(
+                    service_id=service_id,
+                    character_ids=sorted(character_ids),
+                    from_ts=from_ts,
+                    to_ts=to_ts,
+                    custom_filter=custom_filter,
+                    **kwargs,
+                )
+
+    return events
+
+
 def generate_outfit_characters_data(
     service_id: str,
     outfit_tag: str,
     time_frames: Iterable[Tuple[int, int]],
     custom_filter: Callable[[dict], bool] = lambda _: True,
+    session_inactivity_gap: int = SESSION_INACTIVITY_GAP,
 ):
+    # Checked before fetching so that a bad setting does not waste a long run
+    if session_inactivity_gap <= 0:
+        raise ValueError(
+            f"Inactivity gap must be positive, got {session_inactivity_gap}"
+        )
+
+    time_frames = list(time_frames)
+
+    time_frame_members: Dict[
+        Tuple[int, int], List[Dict[str, str]]
+    ] = get_time_frames_members(
+        service_id=service_id, outfit_tag=outfit_tag, time_frames=time_frames
+    )
+
+    fetched_events: List[dict] = get_time_frames_events(
+        service_id=service_id,
+        time_frame_members=time_frame_members,
+        custom_filter=custom_filter,
+    )
+
     member_events: List[dict] = []
 
     for from_ts, to_ts in time_frames:
         print(f"From {from_ts} to {to_ts}")
 
-        members: List[Dict[str, str]] = get_active_outfit_members(
-            service_id=service_id, outfit_tag=outfit_tag, active_after_ts=from_ts
-        )
+        frame_character_ids: Set[int] = {
+            m["id"] for m in time_frame_members[(from_ts, to_ts)]
+        }
 
-        time_frame_events: List[dict] = (
-            get_character_events(
-                service_id=service_id,
-                character_ids=[m["id"] for m in members],
-                from_ts=from_ts,
-                to_ts=to_ts,
-                custom_filter=custom_filter,
+        time_frame_events: List[dict] = [
+            e
+            for e in fetched_events
+            if to_ts >= int(e["timestamp"]) >= from_ts
+            and (
+                int(e["character_id"]) in frame_character_ids
+                or int(e.get("attacker_character_id", 0)) in frame_character_ids
             )
-        )
-
-        duplicates: List[Tuple[dict, int]] = [
-            (json.loads(v), c)
-            for v, c in Counter(
-                (json.dumps(e, sort_keys=True) for e in time_frame_events)
-            ).items()
-            if c > 1
         ]
 
+        with profiler.phase("dedup"):
+            duplicates: List[Tuple[dict, int]] = [
+                (json.loads(v), c)
+                for v, c in Counter(
+                    (json.dumps(e, sort_keys=True) for e in time_frame_events)
+                ).items()
+                if c > 1
+            ]
+
         print(
             f"""
         {len(time_frame_events)} events
@@ -225,6 +632,14 @@ def generate_outfit_characters_data(
 
         member_events += time_frame_events
 
+    members: List[Dict[str, str]] = list(
+        {
+            m["id"]: m
+            for frame_members in time_frame_members.values()
+            for m in frame_members
+        }.values()
+    )
+
     print(f"Total {len(member_events)} events")
 
     member_rows: List[dict] = []
@@ -235,473 +650,50 @@ def generate_outfit_characters_data(
         name: str = m["name"]
         rank: str = m["rank"]
 
-        m_events: List[dict] = list(
-            filter(
-                lambda x: m_id
-                in {int(x["character_id"]), int(x.get("attacker_character_id", 0))},
-                member_events,
-            )
-        )
-
-        if m_events:
-            member_row: dict = {
-                "name": name,
-                "rank": rank,
-                "active_time_hours": round(
-                    (15 * 60)
-                    * len(
-                        set(
-                            int(e["timestamp"]) // (15 * 60)
-                            for e in filter(
-                                lambda x: m_id
-                                in {
-                                    int(x["character_id"]),
-                                    int(x.get("attacker_character_id", 0)),
-                                },
-                                m_events,
-                            )
-                        )
-                    )
-                    / 3600,
-                    2,
-                ),
-                "kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id,
-                            m_events,
-                        )
-                    )
-                ),
-                "vs_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and Faction(int(x["character"]["faction_id"]))
-                            == Faction.VANU_SOVEREIGNTY,
-                            m_events,
-                        )
-                    )
-                ),
-                "nc_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and Faction(int(x["character"]["faction_id"]))
-                            == Faction.NEW_CONGLOMERATE,
-                            m_events,
-                        )
-                    )
-                ),
-                "tr_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and Faction(int(x["character"]["faction_id"]))
-                            == Faction.TERRAN_REPUBLIC,
-                            m_events,
-                        )
-                    )
-                ),
-                "nso_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and Faction(int(x["character"]["faction_id"]))
-                            == Faction.NS_OPERATIVES,
-                            m_events,
-                        )
-                    )
-                ),
-                "teamkills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and Faction(int(x["character"]["faction_id"]))
-                            == Faction(int(x["attacker_character"]["faction_id"])),
-                            m_events,
-                        )
-                    )
-                ),
-                "headshot_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id
-                            and int(x["is_headshot"]) == 1,
-                            m_events,
-                        )
-                    )
-                ),
-                "kill_weapons": json.dumps(
-                    Counter(
-                        (
-                            e["attacker_weapon_item"]["name"]["en"]
-                            for e in filter(
-                                lambda x: x.get("table_type") == "kills"
-                                and int(x["character_id"]) != m_id
-                                and int(x["attacker_character_id"]) == m_id
-                                and "attacker_weapon_item" in x
-                                and "name" in x["attacker_weapon_item"],
-                                m_events,
-                            )
-                        )
-                    ).most_common()
-                ),
-                "kill_vehicles": json.dumps(
-                    Counter(
-                        (
-                            e["vehicle"]["name"]["en"]
-                            for e in filter(
-                                lambda x: x.get("table_type") == "kills"
-                                and int(x["character_id"]) != m_id
-                                and int(x["attacker_character_id"]) == m_id
-                                and "vehicle" in x,
-                                m_events,
-                            )
-                        )
-                    ).most_common()
-                ),
-                "vehicle_destroys": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "VehicleDestroy"
-                            and int(x["character_id"]) != m_id
-                            and int(x["attacker_character_id"]) == m_id,
-                            m_events,
-                        )
-                    )
-                ),
-                "deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id,
-                            m_events,
-                        )
-                    )
-                ),
-                "vs_deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id
-                            and "attacker_character" in x
-                            and Faction(int(x["attacker_character"]["faction_id"]))
-                            == Faction.VANU_SOVEREIGNTY,
-                            m_events,
-                        )
-                    )
-                ),
-                "nc_deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id
-                            and "attacker_character" in x
-                            and Faction(int(x["attacker_character"]["faction_id"]))
-                            == Faction.NEW_CONGLOMERATE,
-                            m_events,
-                        )
-                    )
-                ),
-                "tr_deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id
-                            and "attacker_character" in x
-                            and Faction(int(x["attacker_character"]["faction_id"]))
-                            == Faction.TERRAN_REPUBLIC,
-                            m_events,
-                        )
-                    )
-                ),
-                "nso_deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id
-                            and "attacker_character" in x
-                            and Faction(int(x["attacker_character"]["faction_id"]))
-                            == Faction.NS_OPERATIVES,
-                            m_events,
-                        )
-                    )
-                ),
-                "teamdeaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) != m_id
-                            and "attacker_character" in x
-                            and Faction(int(x["attacker_character"]["faction_id"]))
-                            == Faction(int(x["character"]["faction_id"])),
-                            m_events,
-                        )
-                    )
-                ),
-                "self_kills": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "kills"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) == m_id,
-                            m_events,
-                        )
-                    )
-                ),
-                "self_deaths": len(
-                    list(
-                        filter(
-                            lambda x: x.get("table_type") == "deaths"
-                            and int(x["character_id"]) == m_id
-                            and int(x["attacker_character_id"]) == m_id,
-                            m_events,
-                        )
-                    )
-                ),
-                "death_weapons": json.dumps(
-                    Counter(
-                        (
-                            e["attacker_weapon_item"]["name"]["en"]
-                            for e in filter(
-                                lambda x: x.get("table_type") == "deaths"
-                                and int(x["character_id"]) == m_id
-                                and int(x["attacker_character_id"]) != m_id
-                                and "attacker_weapon_item" in x
-                                and "name" in x["attacker_weapon_item"],
+        with profiler.phase("aggregation"):
+            with profiler.phase("member_events"):
+                m_events: List[dict] = list(
+                    filter(
+                        lambda x: m_id
+                        in {
+                            int(x["character_id"]),
+                            int(x.get("attacker_character_id", 0)),
+                        },
+                        member_events,
+                    )
+                )
+
+            if m_events:
+                member_row: dict = {"name": name, "rank": rank}
+
+                column: str
+                metric: Callable[[int, List[dict]], Union[int, float, str]]
+                for column, metric in member_metrics.items():
+                    with profiler.phase(column):
+                        member_row[column] = metric(m_id, m_events)
+
+                with profiler.phase("sessions"):
+                    member_row.update(
+                        get_session_columns(
+                            get_sessions(
+                                m_id,
                                 m_events,
+                                set(RIBBON_ACHIEVEMENT_IDS.values()),
+                                time_frames,
+                                session_inactivity_gap,
                             )
                         )
-                    ).most_common()
-                ),
-                "death_vehicles": json.dumps(
-                    Counter(
-                        (
-                            e["vehicle"]["name"]["en"]
-                            for e in filter(
-                                lambda x: x.get("table_type") == "deaths"
-                                and int(x["character_id"]) == m_id
-                                and int(x["attacker_character_id"]) != m_id
-                                and "vehicle" in x,
-                                m_events,
-                            )
-                        )
-                    ).most_common()
-                ),
-                "facility_captures": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "PlayerFacilityCapture",
-                            m_events,
-                        )
                     )
-                ),
-                "facility_defends": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "PlayerFacilityDefend",
-                            m_events,
-                        )
-                    )
-                ),
-                "marksman_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90028,
-                            m_events,
-                        )
-                    )
-                ),
-                "killstreak_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90036,
-                            m_events,
-                        )
-                    )
-                ),
-                "bountycontracts_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 92038,
-                            m_events,
-                        )
-                    )
-                ),
-                "repair_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 2553,
-                            m_events,
-                        )
-                    )
-                ),
-                "squadleadership_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90040,
-                            m_events,
-                        )
-                    )
-                ),
-                "pointcontrol_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90030,
-                            m_events,
-                        )
-                    )
-                ),
-                "piloting_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 2555,
-                            m_events,
-                        )
-                    )
-                ),
-                "healing_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 2554,
-                            m_events,
-                        )
-                    )
-                ),
-                "spotter_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90024,
-                            m_events,
-                        )
-                    )
-                ),
-                "objectivesupport_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90032,
-                            m_events,
-                        )
-                    )
-                ),
-                "savior_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 90021,
-                            m_events,
-                        )
-                    )
-                ),
-                "reviving_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 2552,
-                            m_events,
-                        )
-                    )
-                ),
-                "logistics_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 8006,
-                            m_events,
-                        )
-                    )
-                ),
-                "resupply_ribbons": len(
-                    list(
-                        filter(
-                            lambda x: x.get("event_type") == "AchievementEarned"
-                            and int(x["achievement_id"]) == 7995,
-                            m_events,
-                        )
-                    )
-                ),
-            }
-
-            member_rows.append(member_row)
-
-    member_columns: List[str] = [
-        "name",
-        "rank",
-        "active_time_hours",
-        "kills",
-        "vs_kills",
-        "nc_kills",
-        "tr_kills",
-        "nso_kills",
-        "teamkills",
-        "headshot_kills",
-        "kill_weapons",
-        "kill_vehicles",
-        "vehicle_destroys",
-        "deaths",
-        "vs_deaths",
-        "nc_deaths",
-        "tr_deaths",
-        "nso_deaths",
-        "teamdeaths",
-        "self_kills",
-        "self_deaths",
-        "death_weapons",
-        "death_vehicles",
-        "facility_captures",
-        "facility_defends",
-        "marksman_ribbons",
-        "killstreak_ribbons",
-        "bountycontracts_ribbons",
-        "repair_ribbons",
-        "squadleadership_ribbons",
-        "pointcontrol_ribbons",
-        "piloting_ribbons",
-        "healing_ribbons",
-        "spotter_ribbons",
-        "objectivesupport_ribbons",
-        "savior_ribbons",
-        "reviving_ribbons",
-        "logistics_ribbons",
-        "resupply_ribbons",
-    ]
+
+                member_rows.append(member_row)
+
+    member_columns: List[str] = ["name", "rank", *member_metrics, *session_columns]
 
     time_frames_filename_part: str = "_".join(
         "-".join(str(i) for i in e) for e in time_frames
     )
 
-    with open(
+    with profiler.phase("csv_write"), open(
         f"output/{slugify(outfit_tag)}_members_{time_frames_filename_part}.csv", "w"
     ) as f:
         writer = csv.DictWriter(f, fieldnames=member_columns)
@@ -0,0 +1,240 @@
+import csv
+import heapq
+import json
+from collections import Counter, defaultdict
+from typing import Callable, DefaultDict, Dict, Iterable, List, Set, Tuple
+
+from ps2_census.enums import Faction
+from slugify import slugify
+
+from characters import get_time_frames_events, get_time_frames_members
+from phase_profiler import profiler
+from utils import merge_intervals
+
+KILL_TABLE_TYPES: Set[str] = {"kills", "deaths"}
+
+
+def get_kill_events(events: Iterable[dict]) -> Iterable[dict]:
+    # The same kill is returned once as the attacker's kill and once as the
+    # victim's death when both characters were queried
+    seen: Set[Tuple[str, str, str, str]] = set()
+
+    e: dict
+    for e in events:
+        if e.get("table_type") not in KILL_TABLE_TYPES:
+            continue
+
+        attacker_id: str = e.get("attacker_character_id", "0")
+        if attacker_id in {"0", e["character_id"]}:
+            continue
+
+        key: Tuple[str, str, str, str] = (
+            e["timestamp"],
+            e["character_id"],
+            attacker_id,
+            e.get("attacker_weapon_id", "0"),
+        )
+        if key in seen:
+            continue
+
+        seen.add(key)
+        yield e
+
+
+def build_engagements(
+    events: Iterable[dict], character_outfits: Dict[int, str]
+) -> dict:
+    character_index: Dict[int, int] = {}
+    character_names: List[str] = []
+    character_outfit_indices: List[int] = []
+    outfit_index: Dict[str, int] = {}
+    faction_index: Dict[Faction, int] = {}
+    outfit_factions: List[int] = []
+
+    character_matrix: Counter = Counter()
+    outfit_matrix: Counter = Counter()
+    faction_matrix: Counter = Counter()
+    outfit_weapons: DefaultDict[Tuple[int, int], Counter] = defaultdict(Counter)
+    outfit_minutes: DefaultDict[Tuple[int, int], Counter] = defaultdict(Counter)
+
+    def index_character(character_id: int, character: dict) -> int:
+        if character_id not in character_index:
+            faction: Faction = Faction(int(character.get("faction_id", 0)))
+            outfit: str = character_outfits.get(character_id, faction.name)
+
+            if outfit not in outfit_index:
+                outfit_index[outfit] = len(outfit_index)
+                outfit_factions.append(
+                    faction_index.setdefault(faction, len(faction_index))
+                )
+
+            character_index[character_id] = len(character_index)
+            character_names.append(
+                character.get("name", {}).get("first", str(character_id))
+            )
+            character_outfit_indices.append(outfit_index[outfit])
+
+        return character_index[character_id]
+
+    e: dict
+    for e in get_kill_events(events):
+        attacker: int = index_character(
+            int(e["attacker_character_id"]), e.get("attacker_character", {})
+        )
+        victim: int = index_character(int(e["character_id"]), e.get("character", {}))
+
+        attacker_outfit: int = character_outfit_indices[attacker]
+        victim_outfit: int = character_outfit_indices[victim]
+
+        character_matrix[(attacker, victim)] += 1
+        outfit_matrix[(attacker_outfit, victim_outfit)] += 1
+        faction_matrix[
+            (outfit_factions[attacker_outfit], outfit_factions[victim_outfit])
+        ] += 1
+
+        if "attacker_weapon_item" in e and "name" in e["attacker_weapon_item"]:
+            outfit_weapons[(attacker_outfit, victim_outfit)][
+                e["attacker_weapon_item"]["name"]["en"]
+            ] += 1
+
+        outfit_minutes[(attacker_outfit, victim_outfit)][
+            int(e["timestamp"]) // 60 * 60
+        ] += 1
+
+    return {
+        "characters": character_names,
+        "character_outfits": character_outfit_indices,
+        "outfits": list(outfit_index),
+        "factions": [f.name for f in faction_index],
+        "character_matrix": character_matrix,
+        "outfit_matrix": outfit_matrix,
+        "faction_matrix": faction_matrix,
+        "outfit_weapons": outfit_weapons,
+        "outfit_minutes": outfit_minutes,
+    }
+
+
+def generate_outfits_engagements_data(
+    service_id: str,
+    outfit_tags: Iterable[str],
+    time_frames: Iterable[Tuple[int, int]],
+    custom_filter: Callable[[dict], bool] = lambda _: True,
+    top_count: int = 50,
+):
+    outfit_tags = list(outfit_tags)
+    time_frames = list(time_frames)
+
+    character_outfits: Dict[int, str] = {}
+    time_frame_members: Dict[Tuple[int, int], List[Dict[str, str]]] = {
+        time_frame: [] for time_frame in time_frames
+    }
+
+    outfit_tag: str
+    for outfit_tag in outfit_tags:
+        time_frame: Tuple[int, int]
+        frame_members: List[Dict[str, str]]
+        for time_frame, frame_members in get_time_frames_members(
+            service_id=service_id, outfit_tag=outfit_tag, time_frames=time_frames
+        ).items():
+            time_frame_members[time_frame] += frame_members
+
+            for m in frame_members:
+                character_outfits[m["id"]] = outfit_tag
+
+    events: List[dict] = get_time_frames_events(
+        service_id=service_id,
+        time_frame_members=time_frame_members,
+        custom_filter=custom_filter,
+        types=("DEATH", "KILL"),
+    )
+
+    with profiler.phase("engagements"):
+        engagements: dict = build_engagements(events, character_outfits)
+
+    characters: List[str] = engagements["characters"]
+    character_outfit_names: List[str] = [
+        engagements["outfits"][o] for o in engagements["character_outfits"]
+    ]
+    outfits: List[str] = engagements["outfits"]
+    factions: List[str] = engagements["factions"]
+
+    print(
+        f"Got {sum(engagements['character_matrix'].values())} kills between "
+        f"{len(characters)} characters of {len(outfits)} outfits"
+    )
+
+    filename_prefix: str = "output/{}_engagements_{}".format(
+        "-".join(slugify(t) for t in outfit_tags),
+        "_".join("-".join(str(i) for i in e) for e in time_frames),
+    )
+
+    with profiler.phase("csv_write"):
+        with open(f"{filename_prefix}_characters.csv", "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["attacker", "attacker_outfit", "victim", "victim_outfit", "kills"]
+            )
+            for (attacker, victim), kills in heapq.nlargest(
+                top_count,
+                engagements["character_matrix"].items(),
+                key=lambda x: x[1],
+            ):
+                writer.writerow(
+                    [
+                        characters[attacker],
+                        character_outfit_names[attacker],
+                        characters[victim],
+                        character_outfit_names[victim],
+                        kills,
+                    ]
+                )
+
+        with open(f"{filename_prefix}_outfits.csv", "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["attacker_outfit", "victim_outfit", "kills", "weapons"])
+            for (attacker, victim), kills in sorted(
+                engagements["outfit_matrix"].items(), key=lambda x: -x[1]
+            ):
+                writer.writerow(
+                    [
+                        outfits[attacker],
+                        outfits[victim],
+                        kills,
+                        json.dumps(
+                            engagements["outfit_weapons"][
+                                (attacker, victim)
+                            ].most_common()
+                        ),
+                    ]
+                )
+
+        with open(f"{filename_prefix}_factions.csv", "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["attacker_faction", "victim_faction", "kills"])
+            writer.writerows(
+                (factions[attacker], factions[victim], kills)
+                for (attacker, victim), kills in sorted(
+                    engagements["faction_matrix"].items(), key=lambda x: -x[1]
+                )
+            )
+
+        with open(f"{filename_prefix}_timeline.csv", "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["minute", "attacker_outfit", "victim_outfit", "kills"])
+            # Minutes without kills are written as zeros so that every pairing
+            # has a continuous series over each frame
+            pairings: List[Tuple[int, int]] = sorted(engagements["outfit_matrix"])
+
+            for from_ts, to_ts in merge_intervals(time_frames):
+                for minute in range(from_ts // 60 * 60, to_ts + 1, 60):
+                    for attacker, victim in pairings:
+                        writer.writerow(
+                            [
+                                minute,
+                                outfits[attacker],
+                                outfits[victim],
+                                engagements["outfit_minutes"][(attacker, victim)][
+                                    minute
+                                ],
+                            ]
+                        )
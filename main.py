@@ -1,18 +1,28 @@
 import os
+import time
 from typing import Optional, Tuple
 
 from ps2_census.enums import Zone
 
 from characters import generate_outfit_characters_data
+from engagements import generate_outfits_engagements_data
+from phase_profiler import profiler
+from transport import REPLAY, transport
 
 SERVICE_ID: Optional[str] = os.environ.get("CENSUS_SERVICE_ID")
+PROFILE: bool = bool(os.environ.get("PROFILE"))
+PROFILE_ALLOCATIONS: bool = bool(os.environ.get("PROFILE_ALLOCATIONS"))
+ENGAGEMENTS: bool = bool(os.environ.get("ENGAGEMENTS"))
+TRANSPORT: str = os.environ.get("CENSUS_TRANSPORT", "live")
+ARCHIVE: str = os.environ.get("CENSUS_ARCHIVE", "output/census_archive.jsonl")
+REPLAY_LATENCY: bool = bool(os.environ.get("CENSUS_REPLAY_LATENCY"))
 
 RVNX: str = "RvnX"
 YLBT: str = "YLBT"
 RAVE: str = "RAVE"
 TCFB: str = "TCFB"
 
-if not SERVICE_ID:
+if not SERVICE_ID and TRANSPORT != REPLAY:
     raise ValueError("CENSUS_SERVICE_ID envvar not found")
 
 DAY_1: Tuple[int, int] = (1588914000, 1588942800)
@@ -33,9 +43,34 @@ def desolation_filter(event: dict) -> bool:
     }
 
 
-generate_outfit_characters_data(
-    service_id=SERVICE_ID,
-    outfit_tag=TCFB,
-    time_frames=(WAR,),
-    custom_filter=desolation_filter,
-)
+transport.configure(mode=TRANSPORT, archive_path=ARCHIVE, inject_latency=REPLAY_LATENCY)
+
+if PROFILE:
+    profiler.enable(track_allocations=PROFILE_ALLOCATIONS)
+
+try:
+    generate_outfit_characters_data(
+        service_id=SERVICE_ID,
+        outfit_tag=TCFB,
+        time_frames=(WAR,),
+        custom_filter=desolation_filter,
+    )
+
+    if ENGAGEMENTS:
+        generate_outfits_engagements_data(
+            service_id=SERVICE_ID,
+            outfit_tags=(RVNX, RAVE, TCFB),
+            time_frames=(WAR,),
+            custom_filter=desolation_filter,
+        )
+finally:
+    transport.close()
+
+if PROFILE:
+    profiler.disable()
+
+    profile_filename_part: str = f"output/profile_{int(time.time())}"
+    profiler.write_folded(f"{profile_filename_part}.folded")
+    profiler.write_summary(f"{profile_filename_part}.txt")
+
+    print(profiler.summary())
@@ -0,0 +1,141 @@
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List
+
+
+class PhaseStats:
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.wall_time: float = 0.0
+        self.cpu_time: float = 0.0
+        self.children_wall_time: float = 0.0
+        self.peak_allocated_bytes: int = 0
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.track_allocations: bool = False
+        self.stats: Dict[str, PhaseStats] = {}
+        self._stack: List[str] = []
+        # Traced memory at phase start and highest traced memory seen so far,
+        # one entry per open phase
+        self._memory_stack: List[List[int]] = []
+
+    def enable(self, track_allocations: bool = False) -> None:
+        # Tracing allocations slows down allocation heavy code, which skews the
+        # recorded times, so it is only switched on when asked for
+        self.enabled = True
+        self.track_allocations = track_allocations
+
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+        if self.track_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        self.track_allocations = False
+
+    def phase(self, name: str) -> ContextManager:
+        # Disabled profiling costs a single attribute check per hook
+        if not self.enabled:
+            return nullcontext()
+
+        return self._record(name)
+
+    @contextmanager
+    def _record(self, name: str) -> Iterator[None]:
+        self._stack.append(name)
+        key: str = ";".join(self._stack)
+
+        if self.track_allocations:
+            self._enter_memory()
+
+        start_cpu: float = time.process_time()
+        start_wall: float = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            wall_time: float = time.perf_counter() - start_wall
+            cpu_time: float = time.process_time() - start_cpu
+            peak_allocated: int = self._exit_memory() if self.track_allocations else 0
+
+            self._stack.pop()
+
+            stats: PhaseStats = self.stats.setdefault(key, PhaseStats())
+            stats.calls += 1
+            stats.wall_time += wall_time
+            stats.cpu_time += cpu_time
+            stats.peak_allocated_bytes = max(stats.peak_allocated_bytes, peak_allocated)
+
+            if self._stack:
+                parent: PhaseStats = self.stats.setdefault(
+                    ";".join(self._stack), PhaseStats()
+                )
+                parent.children_wall_time += wall_time
+
+    def _enter_memory(self) -> None:
+        current: int
+        peak: int
+        current, peak = tracemalloc.get_traced_memory()
+
+        if self._memory_stack:
+            parent: List[int] = self._memory_stack[-1]
+            parent[1] = max(parent[1], peak)
+
+        self._memory_stack.append([current, current])
+        tracemalloc.reset_peak()
+
+    def _exit_memory(self) -> int:
+        start: int
+        peak: int
+        start, peak = self._memory_stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+
+        if self._memory_stack:
+            parent: List[int] = self._memory_stack[-1]
+            parent[1] = max(parent[1], peak)
+
+        tracemalloc.reset_peak()
+
+        return peak - start
+
+    def write_folded(self, path: str) -> None:
+        # Collapsed stacks with exclusive wall time in microseconds, as consumed
+        # by flamegraph.pl, speedscope or inferno
+        with open(path, "w") as f:
+            key: str
+            stats: PhaseStats
+            for key, stats in sorted(self.stats.items()):
+                self_time: float = max(stats.wall_time - stats.children_wall_time, 0)
+                f.write(f"{key} {round(self_time * 1_000_000)}\n")
+
+    def summary(self) -> str:
+        lines: List[str] = [
+            f"{'phase':<60} {'calls':>8} {'wall_s':>10} {'cpu_s':>10} {'peak_kib':>12}"
+        ]
+
+        key: str
+        stats: PhaseStats
+        for key, stats in sorted(
+            self.stats.items(), key=lambda x: x[1].wall_time, reverse=True
+        ):
+            lines.append(
+                f"{key:<60} {stats.calls:>8} {stats.wall_time:>10.3f} "
+                f"{stats.cpu_time:>10.3f} {stats.peak_allocated_bytes / 1024:>12.1f}"
+            )
+
+        return "\n".join(lines)
+
+    def write_summary(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.summary())
+            f.write("\n")
+
+
+profiler: Profiler = Profiler()
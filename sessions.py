@@ -0,0 +1,142 @@
+import json
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from utils import merge_intervals
+
+SESSION_INACTIVITY_GAP: int = 15 * 60
+
+session_columns: List[str] = [
+    "sessions",
+    "play_time_hours",
+    "kills_per_hour",
+    "ribbons_per_hour",
+    "session_stats",
+]
+
+
+def get_sessions(
+    m_id: int,
+    m_events: List[dict],
+    ribbon_achievement_ids: Set[int],
+    time_frames: Iterable[Tuple[int, int]],
+    inactivity_gap: int = SESSION_INACTIVITY_GAP,
+) -> List[Dict[str, int]]:
+    if inactivity_gap <= 0:
+        raise ValueError(f"Inactivity gap must be positive, got {inactivity_gap}")
+
+    sessions: List[Dict[str, int]] = []
+    # Events of overlapping frames, or fetched for several members, are listed
+    # more than once but must only be counted once
+    seen: Set[Tuple[str, ...]] = set()
+
+    e: dict
+    for e in sorted(m_events, key=lambda x: int(x["timestamp"])):
+        key: Tuple[str, ...] = (
+            e["timestamp"],
+            e.get("table_type", ""),
+            e.get("event_type", ""),
+            e["character_id"],
+            e.get("attacker_character_id", ""),
+            e.get("attacker_weapon_id", ""),
+            e.get("achievement_id", ""),
+            e.get("facility_id", ""),
+        )
+        if key in seen:
+            continue
+
+        seen.add(key)
+
+        timestamp: int = int(e["timestamp"])
+
+        if not sessions or timestamp - sessions[-1]["end"] > inactivity_gap:
+            sessions.append(
+                {
+                    "start": timestamp,
+                    "end": timestamp,
+                    "kills": 0,
+                    "deaths": 0,
+                    "ribbons": 0,
+                }
+            )
+
+        session: Dict[str, int] = sessions[-1]
+        session["end"] = timestamp
+
+        table_type: str = e.get("table_type")
+        attacker_id: int = int(e.get("attacker_character_id", 0))
+
+        if (
+            table_type == "kills"
+            and int(e["character_id"]) != m_id
+            and attacker_id == m_id
+        ):
+            session["kills"] += 1
+        elif (
+            table_type == "deaths"
+            and int(e["character_id"]) == m_id
+            and attacker_id != m_id
+        ):
+            session["deaths"] += 1
+        elif (
+            e.get("event_type") == "AchievementEarned"
+            and int(e["achievement_id"]) in ribbon_achievement_ids
+        ):
+            session["ribbons"] += 1
+
+    # Events only sample play time, so each session is padded by half the
+    # inactivity gap on both sides, without going past the requested frames
+    frames: List[Tuple[int, int]] = merge_intervals(time_frames)
+
+    for session in sessions:
+        lower_bound: int = session["start"] - inactivity_gap // 2
+        upper_bound: int = session["end"] + inactivity_gap - inactivity_gap // 2
+
+        session["duration"] = sum(
+            max(min(upper_bound, to_ts) - max(lower_bound, from_ts), 0)
+            for from_ts, to_ts in frames
+        )
+
+    return sessions
+
+
+def get_session_columns(
+    sessions: List[Dict[str, int]]
+) -> Dict[str, Union[int, float, str]]:
+    play_time_hours: float = sum(s["duration"] for s in sessions) / 3600
+
+    return {
+        "sessions": len(sessions),
+        "play_time_hours": round(play_time_hours, 2),
+        "kills_per_hour": (
+            round(sum(s["kills"] for s in sessions) / play_time_hours, 2)
+            if play_time_hours
+            else 0
+        ),
+        "ribbons_per_hour": (
+            round(sum(s["ribbons"] for s in sessions) / play_time_hours, 2)
+            if play_time_hours
+            else 0
+        ),
+        "session_stats": json.dumps(
+            [
+                {
+                    "start": s["start"],
+                    "end": s["end"],
+                    "hours": round(s["duration"] / 3600, 2),
+                    "kills": s["kills"],
+                    "deaths": s["deaths"],
+                    "kd": (
+                        round(s["kills"] / s["deaths"], 2)
+                        if s["deaths"]
+                        else s["kills"]
+                    ),
+                    "ribbons_per_hour": (
+                        round(s["ribbons"] * 3600 / s["duration"], 2)
+                        if s["duration"]
+                        else 0
+                    ),
+                }
+                for s in sessions
+            ]
+        ),
+    }
@@ -0,0 +1,146 @@
+import gzip
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from ps2_census import Query
+
+LIVE: str = "live"
+RECORD: str = "record"
+REPLAY: str = "replay"
+
+MODES: Tuple[str, ...] = (LIVE, RECORD, REPLAY)
+
+
+def get_query_key(query: Query) -> str:
+    # The service ID is left out so that archives replay without credentials
+    return json.dumps(
+        [
+            str(query.collection),
+            str(query.namespace),
+            sorted((k, sorted(v)) for k, v in query.parameters.items()),
+        ],
+        separators=(",", ":"),
+    )
+
+
+class Transport:
+    def __init__(self) -> None:
+        self.mode: str = LIVE
+        self.archive_path: Optional[str] = None
+        self.inject_latency: bool = False
+        self._archive: Dict[str, Tuple[float, dict]] = {}
+        self._record_file = None
+
+    def configure(
+        self,
+        mode: str,
+        archive_path: Optional[str] = None,
+        inject_latency: bool = False,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown transport mode {mode}, expected one of {MODES}")
+
+        if mode != LIVE and not archive_path:
+            raise ValueError(f"Transport mode {mode} requires an archive path")
+
+        self.close()
+
+        self.mode = mode
+        self.archive_path = archive_path
+        self.inject_latency = inject_latency
+        self._archive = {}
+
+        if mode == RECORD:
+            # Plain JSON lines, so that a run killed mid-write only loses its
+            # last line and later runs can keep appending to the same archive
+            needs_newline: bool = False
+            if os.path.exists(archive_path) and os.path.getsize(archive_path):
+                with open(archive_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+
+            self._record_file = open(archive_path, "a")
+
+            if needs_newline:
+                self._record_file.write("\n")
+        elif mode == REPLAY:
+            self._load_archive(archive_path)
+
+    def _load_archive(self, archive_path: str) -> None:
+        skipped_lines: int = 0
+
+        # Archives may be compressed after recording to save space
+        with (
+            gzip.open(archive_path, "rt")
+            if archive_path.endswith(".gz")
+            else open(archive_path)
+        ) as f:
+            try:
+                for line in f:
+                    try:
+                        entry: dict = json.loads(line)
+                    except json.JSONDecodeError:
+                        skipped_lines += 1
+                        continue
+
+                    self._archive[entry["key"]] = (entry["latency"], entry["response"])
+            except EOFError:
+                print(
+                    f"Archive {archive_path} is truncated, using the queries read so far"
+                )
+
+        print(
+            f"Loaded {len(self._archive)} queries from {archive_path}, "
+            f"skipped {skipped_lines} unreadable lines"
+        )
+
+    def close(self) -> None:
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    def get(self, query: Query) -> dict:
+        if self.mode == REPLAY:
+            key: str = get_query_key(query)
+
+            if key not in self._archive:
+                raise Exception(f"Query not found in {self.archive_path}: {key}")
+
+            latency: float
+            res: dict
+            latency, res = self._archive[key]
+
+            if self.inject_latency:
+                time.sleep(latency)
+
+            return res
+
+        start: float = time.perf_counter()
+        res = query.get()
+        latency = time.perf_counter() - start
+
+        if self.mode == RECORD:
+            self._record_file.write(
+                json.dumps(
+                    {
+                        "key": get_query_key(query),
+                        "latency": round(latency, 4),
+                        "response": res,
+                    },
+                    separators=(",", ":"),
+                )
+            )
+            self._record_file.write("\n")
+            self._record_file.flush()
+
+        return res
+
+    def throttle(self, seconds: float) -> None:
+        # Replayed queries never reach the API so they need no rate limiting
+        if self.mode != REPLAY:
+            time.sleep(seconds)
+
+
+transport: Transport = Transport()
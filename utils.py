@@ -1,5 +1,5 @@
 from itertools import chain, islice
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, List, Tuple
 
 
 def batch(iterable: Iterable, batch_size: int) -> list:
@@ -11,3 +11,17 @@ def batch(iterable: Iterable, batch_size: int) -> list:
             yield list(chain([next(batch_iterable)], batch_iterable))
         except StopIteration:
             return
+
+
+def merge_intervals(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+
+    lower: int
+    upper: int
+    for lower, upper in sorted(intervals):
+        if merged and lower <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], upper))
+        else:
+            merged.append((lower, upper))
+
+    return merged